@@ -31,8 +31,8 @@ class CarState(object):
         self.wheelSpinVel = None
         self.z = None
     
-    def setFromMsg(self, str_sensors):
-        self.sensors = self.parser.parse(str_sensors)
+    def setFromMsg(self, str_sensors, length=None):
+        self.sensors = self.parser.parse(str_sensors, length)
         
         self.setAngleD()
         self.setCurLapTimeD()
@@ -1,108 +1,246 @@
 import csv
 import time
 from datetime import datetime
+from operator import attrgetter
 import os
+from lap_analytics import LapAnalytics
+
+# Where every column comes from: (source, attribute, index). The source is
+# the logger itself, the CarState or the CarControl; index picks one value
+# out of a list attribute such as the rangefinders.
+LOGGER, STATE, CONTROL = 0, 1, 2
+
+COLUMNS = {
+    # Race information
+    'timestamp': (LOGGER, 'timestamp', None),
+    'lap_number': (LOGGER, 'current_lap', None),
+    'lap_time': (STATE, 'lastLapTime', None),
+    'race_position': (STATE, 'racePos', None),
+
+    # Car state
+    'speed_x': (STATE, 'speedX', None),
+    'speed_y': (STATE, 'speedY', None),
+    'speed_z': (STATE, 'speedZ', None),
+    'rpm': (STATE, 'rpm', None),
+    'gear': (STATE, 'gear', None),
+    'fuel': (STATE, 'fuel', None),
+    'angle': (STATE, 'angle', None),
+    'track_position': (STATE, 'trackPos', None),
+    'track_edge_dist': (STATE, 'trackEdgeDist', None),
+
+    # Car control inputs
+    'accel': (CONTROL, 'accel', None),
+    'brake': (CONTROL, 'brake', None),
+    'steer': (CONTROL, 'steer', None),
+    'clutch': (CONTROL, 'clutch', None),
+
+    # Race metadata
+    'track_name': (LOGGER, 'track_name', None),
+    'race_type': (LOGGER, 'race_type', None),
+    'damage': (STATE, 'damage', None),
+    'distance_from_start': (STATE, 'distFromStart', None),
+    'distance_raced': (STATE, 'distRaced', None),
+
+    # Race session info
+    'session_id': (LOGGER, 'session_id', None),
+    'session_start_time': (LOGGER, 'session_start_time', None),
+}
+
+# Track sensors (19 values) and opponent sensors (36 values)
+for i in range(19):
+    COLUMNS[f'track_sensor_{i}'] = (STATE, 'track', i)
+for i in range(36):
+    COLUMNS[f'opponent_sensor_{i}'] = (STATE, 'opponents', i)
+
+# Logger columns that do not change during a session
+SESSION_COLUMNS = {'session_id', 'session_start_time'}
+
+COLUMN_SETS = {
+    # Every column, in the order of the original race_data.csv
+    'full': (
+        ['timestamp', 'lap_number', 'lap_time', 'race_position',
+         'speed_x', 'speed_y', 'speed_z', 'rpm', 'gear', 'fuel',
+         'angle', 'track_position', 'track_edge_dist']
+        + [f'track_sensor_{i}' for i in range(19)]
+        + [f'opponent_sensor_{i}' for i in range(36)]
+        + ['accel', 'brake', 'steer', 'clutch',
+           'track_name', 'race_type', 'damage', 'distance_from_start', 'distance_raced',
+           'session_id', 'session_start_time']
+    ),
+    # Everything but the 55 sensor columns
+    'driving': [
+        'timestamp', 'lap_number', 'lap_time', 'race_position',
+        'speed_x', 'speed_y', 'speed_z', 'rpm', 'gear', 'fuel',
+        'angle', 'track_position', 'track_edge_dist',
+        'accel', 'brake', 'steer', 'clutch',
+        'damage', 'distance_from_start', 'distance_raced', 'session_id',
+    ],
+    # Cheap enough to leave on in production
+    'minimal': [
+        'timestamp', 'lap_number', 'speed_x', 'track_position', 'angle',
+        'distance_from_start', 'accel', 'brake', 'steer',
+    ],
+}
+
+
+def compile_columns(columns):
+    '''
+    Compile a list of column names into row segments
+
+    Consecutive columns read from the same source become one segment, so a
+    row is filled with one attrgetter call per run of scalar columns and one
+    slice copy per run of list values, instead of one getter per column.
+    Returns (segments, constants): segments are (start, stop, source, kind,
+    getter) and constants maps row positions to SESSION_COLUMNS.
+    '''
+    unknown = [name for name in columns if name not in COLUMNS]
+    if unknown:
+        raise ValueError(f'Unknown log columns: {", ".join(unknown)}')
+
+    segments = []
+    constants = {}
+    runs = []
+    for position, name in enumerate(columns):
+        source, attr, index = COLUMNS[name]
+        if name in SESSION_COLUMNS:
+            constants[position] = attr
+            continue
+
+        if runs:
+            start, stop, run_source, run_attr, attrs = runs[-1]
+            if stop == position and run_source == source:
+                if index is None and run_attr is None:
+                    attrs.append(attr)
+                    runs[-1][1] += 1
+                    continue
+                if index is not None and run_attr == attr and attrs[-1] == index - 1:
+                    attrs.append(index)
+                    runs[-1][1] += 1
+                    continue
+
+        if index is None:
+            runs.append([position, position + 1, source, None, [attr]])
+        else:
+            runs.append([position, position + 1, source, attr, [index]])
+
+    for start, stop, source, list_attr, attrs in runs:
+        if list_attr is None:
+            if len(attrs) == 1:
+                segments.append((start, stop, source, 'scalar', attrgetter(attrs[0])))
+            else:
+                segments.append((start, stop, source, 'scalars', attrgetter(*attrs)))
+        else:
+            segments.append((start, stop, source, 'slice', (list_attr, attrs[0], attrs[-1] + 1)))
+
+    return segments, constants
+
 
 class DataLogger:
-    def __init__(self, track_name, race_type):
+    def __init__(self, track_name, race_type, columns='full', sample_every=1, filename=None):
         # Create logs directory if it doesn't exist
         if not os.path.exists('logs'):
             os.makedirs('logs')
-        
-        # Use a single file for all races
-        self.filename = 'logs/race_data.csv'
-        
-        # Define CSV headers
-        self.headers = [
-            # Race information
-            'timestamp', 'lap_number', 'lap_time', 'race_position',
-            
-            # Car state
-            'speed_x', 'speed_y', 'speed_z', 'rpm', 'gear', 'fuel',
-            'angle', 'track_position', 'track_edge_dist',
-            
-            # Track sensors (19 values)
-            'track_sensor_0', 'track_sensor_1', 'track_sensor_2', 'track_sensor_3',
-            'track_sensor_4', 'track_sensor_5', 'track_sensor_6', 'track_sensor_7',
-            'track_sensor_8', 'track_sensor_9', 'track_sensor_10', 'track_sensor_11',
-            'track_sensor_12', 'track_sensor_13', 'track_sensor_14', 'track_sensor_15',
-            'track_sensor_16', 'track_sensor_17', 'track_sensor_18',
-            
-            # Opponent sensors (36 values)
-            'opponent_sensor_0', 'opponent_sensor_1', 'opponent_sensor_2', 'opponent_sensor_3',
-            'opponent_sensor_4', 'opponent_sensor_5', 'opponent_sensor_6', 'opponent_sensor_7',
-            'opponent_sensor_8', 'opponent_sensor_9', 'opponent_sensor_10', 'opponent_sensor_11',
-            'opponent_sensor_12', 'opponent_sensor_13', 'opponent_sensor_14', 'opponent_sensor_15',
-            'opponent_sensor_16', 'opponent_sensor_17', 'opponent_sensor_18', 'opponent_sensor_19',
-            'opponent_sensor_20', 'opponent_sensor_21', 'opponent_sensor_22', 'opponent_sensor_23',
-            'opponent_sensor_24', 'opponent_sensor_25', 'opponent_sensor_26', 'opponent_sensor_27',
-            'opponent_sensor_28', 'opponent_sensor_29', 'opponent_sensor_30', 'opponent_sensor_31',
-            'opponent_sensor_32', 'opponent_sensor_33', 'opponent_sensor_34', 'opponent_sensor_35',
-            
-            # Car control inputs
-            'accel', 'brake', 'steer', 'clutch',
-            
-            # Race metadata
-            'track_name', 'race_type', 'damage', 'distance_from_start', 'distance_raced',
-            
-            # Race session info
-            'session_id', 'session_start_time'
-        ]
-        
-        # Initialize CSV file with headers only if it doesn't exist
-        if not os.path.exists(self.filename):
-            with open(self.filename, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(self.headers)
-        
+
+        # The column set is either the name of one in COLUMN_SETS or a list
+        if isinstance(columns, str):
+            set_name = columns
+            columns = COLUMN_SETS[columns]
+        else:
+            set_name = 'custom'
+        self.headers = list(columns)
+        self.sample_every = max(1, sample_every)
+
+        # All full-schema sessions share one file; other schemas get their own
+        if filename is None:
+            filename = 'logs/race_data.csv' if set_name == 'full' else f'logs/race_data_{set_name}.csv'
+
         self.start_time = time.time()
         self.last_lap_time = 0
         self.current_lap = 0
-        
+        self.ticks = 0
+        self.timestamp = 0.0
+        self.track_name = track_name
+        self.race_type = race_type
+
         # Generate a unique session ID for this race
         self.session_id = datetime.now().strftime('%Y%m%d_%H%M%S')
         self.session_start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
+
+        # A file written with different columns is left alone
+        if os.path.exists(filename):
+            with open(filename, newline='') as f:
+                existing = next(csv.reader(f), None)
+            if existing is not None and existing != self.headers:
+                filename = f'{os.path.splitext(filename)[0]}_{self.session_id}.csv'
+        self.filename = filename
+
+        # Compile the schema once; each logged tick only refills this row
+        self.segments, constants = compile_columns(self.headers)
+        self.row = [None] * len(self.headers)
+        for position, attr in constants.items():
+            self.row[position] = getattr(self, attr)
+
+        # Keep the CSV open for the session and write headers to new files
+        is_new = not os.path.exists(self.filename) or os.path.getsize(self.filename) == 0
+        self.file = open(self.filename, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(self.headers)
+
+        # Online lap and sector statistics, written out when the session closes
+        self.analytics = LapAnalytics()
+        self.summary_filename = f'logs/session_{self.session_id}_summary.json'
+
     def log_data(self, car_state, car_control, track_name, race_type):
-        current_time = time.time() - self.start_time
-        
         # Calculate lap number and time
-        if car_state.getLastLapTime() != self.last_lap_time:
+        if car_state.lastLapTime != self.last_lap_time:
             self.current_lap += 1
-            self.last_lap_time = car_state.getLastLapTime()
-        
-        # Prepare row data
-        row_data = [
-            # Race information
-            current_time, self.current_lap, car_state.getLastLapTime(), car_state.getRacePos(),
-            
-            # Car state
-            car_state.getSpeedX(), car_state.getSpeedY(), car_state.getSpeedZ(),
-            car_state.getRpm(), car_state.getGear(), car_state.getFuel(),
-            car_state.getAngle(), car_state.getTrackPos(), car_state.getTrackEdgeDist(),
-            
-            # Track sensors
-            *car_state.getTrack(),
-            
-            # Opponent sensors
-            *car_state.getOpponents(),
-            
-            # Car control inputs
-            car_control.getAccel(), car_control.getBrake(), car_control.getSteer(), car_control.getClutch(),
-            
-            # Race metadata
-            track_name, race_type, car_state.getDamage(),
-            car_state.getDistFromStart(), car_state.getDistRaced(),
-            
-            # Session info
-            self.session_id, self.session_start_time
-        ]
-        
-        # Append to CSV
-        with open(self.filename, 'a', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(row_data)
-    
+            self.last_lap_time = car_state.lastLapTime
+            # The file stays open, so push each completed lap to disk
+            self.file.flush()
+
+        self.analytics.update(car_state)
+
+        self.ticks += 1
+        if self.ticks % self.sample_every:
+            return
+
+        self.timestamp = time.time() - self.start_time
+        self.track_name = track_name
+        self.race_type = race_type
+
+        # Fill the preallocated row from the compiled schema
+        sources = (self, car_state, car_control)
+        row = self.row
+        for start, stop, source, kind, getter in self.segments:
+            obj = sources[source]
+            if kind == 'scalars':
+                row[start:stop] = getter(obj)
+            elif kind == 'scalar':
+                row[start] = getter(obj)
+            else:
+                attr, first, last = getter
+                values = getattr(obj, attr)
+                if values is None or len(values) < last:
+                    row[start:stop] = [None] * (stop - start)
+                else:
+                    row[start:stop] = values[first:last]
+
+        self.writer.writerow(row)
+
     def close(self):
-        """Close the logger and save any remaining data"""
-        pass  # CSV file is automatically closed after each write 
\ No newline at end of file
+        """Close the logger and save any remaining data; safe to call twice"""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+
+        # session_id has one-second resolution, so a restart that is
+        # identified again within the same second must not overwrite the
+        # previous session's summary
+        base = os.path.splitext(self.summary_filename)[0]
+        episode = 1
+        while os.path.exists(self.summary_filename):
+            episode += 1
+            self.summary_filename = f'{base}_{episode}.json'
+        self.analytics.write_summary(self.summary_filename)
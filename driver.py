@@ -4,13 +4,14 @@ import carControl
 import keyboard
 import time
 from data_logger import DataLogger
+from opponents import OpponentTracker
 
 class Driver(object):
     '''
     A driver object for the SCRC
     '''
 
-    def __init__(self, stage):
+    def __init__(self, stage, keyboard_control=True):
         '''Constructor'''
         self.WARM_UP = 0
         self.QUALIFYING = 1
@@ -42,7 +43,21 @@ class Driver(object):
         # Initialize data logger
         self.logger = None
         
+        # Optional smoothing of noisy sensors, see filters.SensorFilterBank
+        self.filters = None
+        
+        # Nearest car, closing speeds and free lanes from the opponent sensors
+        self.opponents = OpponentTracker()
+        
+        # Distance-indexed track map, set up once the track is known
+        self.track_map = None
+        
         # Set up keyboard event handlers
+        if keyboard_control:
+            self.setup_keyboard()
+    
+    def setup_keyboard(self):
+        '''Hook the manual driving keys (WASD, R for reverse)'''
         keyboard.on_press_key('a', lambda _: self.handle_steering('left'))
         keyboard.on_press_key('d', lambda _: self.handle_steering('right'))
         keyboard.on_release_key('a', lambda _: self.handle_steering('left', release=True))
@@ -67,8 +82,15 @@ class Driver(object):
         
         return self.parser.stringify({'init': self.angles})
     
-    def drive(self, msg):
-        self.state.setFromMsg(msg)
+    def drive(self, msg, length=None):
+        self.state.setFromMsg(msg, length)
+        
+        # Smoothed sensors only feed steering and traffic; the logger, lap
+        # analytics and track map record the raw telemetry
+        if self.filters:
+            self.filters.apply(self.state)
+        
+        self.opponents.update(self.get_filtered('opponents', self.state.getOpponents()))
         
         self.steer()
         
@@ -76,6 +98,9 @@ class Driver(object):
         
         self.speed()
         
+        if self.track_map:
+            self.track_map.update(self.state)
+        
         # Log data if logger is initialized
         if self.logger:
             self.logger.log_data(self.state, self.control, 
@@ -114,8 +139,8 @@ class Driver(object):
             self.control.setSteer(self.external_steer)
         else:
             # Fall back to automatic steering if no external input
-            angle = self.state.angle
-            dist = self.state.trackPos
+            angle = self.get_filtered('angle', self.state.angle)
+            dist = self.get_filtered('trackPos', self.state.trackPos)
             self.control.setSteer((angle - dist*0.5)/self.steer_lock)
     
     def gear(self):
@@ -177,6 +202,18 @@ class Driver(object):
         else:
             self.control.setBrake(0.0)
     
+    def get_filtered(self, name, raw):
+        """Return the smoothed value of a sensor group, or raw when it is not filtered"""
+        if self.filters:
+            return self.filters.filtered(name, raw)
+        return raw
+    
+    def get_next_corner(self):
+        """Return (distance ahead, curvature) of the next mapped corner, or (None, None)"""
+        if not self.track_map or self.state.getDistFromStart() is None:
+            return None, None
+        return self.track_map.get_next_corner(self.state.getDistFromStart())
+    
     def get_race_type(self):
         """Convert stage number to race type string"""
         if self.stage == self.WARM_UP:
@@ -192,12 +229,19 @@ class Driver(object):
         """Called when the race is shutting down"""
         if self.logger:
             self.logger.close()
+        if self.track_map:
+            self.track_map.save()
     
     def onRestart(self):
         """Called when the race is restarting"""
+        self.opponents.reset()
+        if self.filters:
+            self.filters.reset()
         if self.logger:
             self.logger.close()
             self.logger = None
+        if self.track_map:
+            self.track_map.save()
     
     def handle_steering(self, direction, release=False):
         if direction == 'left':
@@ -0,0 +1,146 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+ROOT_LOGGER = 'torcs'
+
+def get_logger(name):
+    '''Return the client logger for a component, e.g. get_logger('pyclient')'''
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+class RateLimitFilter(logging.Filter):
+    '''
+    Lets through at most `burst` records per event every `interval` seconds
+
+    An event is identified by the record's `event` attribute (pass it with
+    extra={'event': ...}) and falls back to the logger name and message
+    template. Every record is counted, whether it is let through or not, and
+    the first record after a suppressed stretch carries the number of records
+    dropped in its `suppressed` attribute.
+    '''
+
+    def __init__(self, interval=1.0, burst=1):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.counters = {}
+        # event -> [window start, records in window, suppressed]
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if event is None:
+            event = f'{record.name}:{record.msg}'
+            record.event = event
+
+        now = time.monotonic()
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + 1
+
+            window = self._windows.get(event)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[event] = [now, 1, 0]
+                record.suppressed = suppressed
+                return True
+
+            if window[1] < self.burst:
+                window[1] += 1
+                record.suppressed = 0
+                return True
+
+            window[2] += 1
+            return False
+
+    def get_counters(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+class StructuredFormatter(logging.Formatter):
+    '''Formats records as `time level logger event=... message key=value ...`'''
+
+    # Attributes every LogRecord has; anything else came in through `extra`
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'event', 'suppressed'}
+
+    def format(self, record):
+        fields = ' '.join(f'{key}={value!r}' for key, value in vars(record).items()
+                          if key not in self.RESERVED)
+        line = (f'{self.formatTime(record)} {record.levelname} {record.name} '
+                f'event={record.event} {record.getMessage()}')
+        if fields:
+            line += ' ' + fields
+        if getattr(record, 'suppressed', 0):
+            line += f' (suppressed {record.suppressed} similar)'
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''QueueHandler that leaves all formatting to the listener thread'''
+
+    def prepare(self, record):
+        return record
+
+
+class EventLog:
+    '''
+    Client-wide structured event log
+
+    The calling thread only runs the rate limit filter and puts the record on
+    an unbounded queue, so the control loop never waits for console or file
+    output; a QueueListener thread formats and writes the records.
+    '''
+
+    def __init__(self, level=logging.INFO, filename='logs/client.log', console=True,
+                 interval=1.0, burst=1):
+        self.rate_limit = RateLimitFilter(interval, burst)
+
+        handlers = []
+        formatter = StructuredFormatter()
+        if console:
+            handlers.append(logging.StreamHandler())
+        if filename:
+            directory = os.path.dirname(filename)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            handlers.append(logging.FileHandler(filename))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        self.queue = queue.SimpleQueue()
+        self.handler = _DeferredQueueHandler(self.queue)
+        self.handler.addFilter(self.rate_limit)
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers)
+
+        self.logger = logging.getLogger(ROOT_LOGGER)
+        self.logger.setLevel(level)
+        self.logger.addHandler(self.handler)
+        self.logger.propagate = False
+
+        self.listener.start()
+        atexit.register(self.close)
+
+    def get_counters(self):
+        return self.rate_limit.get_counters()
+
+    def close(self):
+        '''Log the aggregated event counters and flush the background handler'''
+        if self.listener is None:
+            return
+
+        counters = self.get_counters()
+        if counters:
+            self.logger.info('Event counts', extra={'event': 'event_counts', 'counts': counters})
+
+        self.listener.stop()
+        self.listener = None
+        self.logger.removeHandler(self.handler)
+        atexit.unregister(self.close)
@@ -0,0 +1,245 @@
+import sys
+import numpy as np
+from timing import run_benchmark
+
+# Sensor groups the bank can filter: CarState attribute, size and the range
+# outside which a reading is a sentinel rather than a measurement (rangefinders
+# read -1 off track, opponent sensors read 200 when no car is in range)
+SENSOR_GROUPS = {
+    'track': ('track', 19, 0.0, np.inf),
+    'opponents': ('opponents', 36, -np.inf, 200.0),
+    'trackPos': ('trackPos', 1, -np.inf, np.inf),
+    'angle': ('angle', 1, -np.inf, np.inf),
+}
+
+DEFAULT_CONFIG = {
+    'track': {'method': 'kalman', 'q': 100.0, 'r': 1.0},
+    'opponents': {'method': 'ema', 'alpha': 0.5},
+    'trackPos': {'method': 'kalman', 'q': 1.0, 'r': 0.01},
+    'angle': {'method': 'ema', 'alpha': 0.7},
+}
+
+
+class SensorFilterBank:
+    '''
+    Smooths CarState sensor vectors with EMA and Kalman filters
+
+    Every configured group is packed into one preallocated array, EMA groups
+    first and Kalman groups after them, so each tick is a fixed sequence of
+    NumPy operations over all values at once, whatever the number of groups.
+    The Kalman filter is a constant-velocity model per value with white-noise
+    acceleration of variance q and measurement noise variance r. A sentinel
+    reading (see SENSOR_GROUPS) is passed through unfiltered, and the filter
+    of that value restarts from the next valid reading instead of blending it
+    with the sentinel.
+
+    The CarState itself is never modified: the logger, lap analytics and
+    track map keep recording raw telemetry, and callers pick up the smoothed
+    values with filtered().
+
+    config maps a group name to {'method': 'ema', 'alpha': a} or
+    {'method': 'kalman', 'q': q, 'r': r}; groups that are left out or use
+    'none' are not touched.
+    '''
+
+    def __init__(self, config=None, dt=0.02):
+        if config is None:
+            config = DEFAULT_CONFIG
+        self.dt = dt
+
+        ema = []
+        kalman = []
+        for name, params in config.items():
+            if name not in SENSOR_GROUPS:
+                raise ValueError(f'Unknown sensor group: {name}')
+            method = params.get('method', 'none')
+            if method == 'ema':
+                ema.append((name, params))
+            elif method == 'kalman':
+                kalman.append((name, params))
+            elif method != 'none':
+                raise ValueError(f'Unknown filter method for {name}: {method}')
+
+        # (attribute, slice, is_list) for every filtered group, in buffer order
+        self.groups = []
+        self._by_name = {}
+        self.num_ema = self._layout(ema)
+        self.num_kalman = self._layout(kalman)
+        n = self.num_ema + self.num_kalman
+
+        self.z = np.zeros(n)
+        self.x = np.zeros(n)
+        self.low = np.empty(n)
+        self.high = np.empty(n)
+        self.alpha = np.zeros(self.num_ema)
+        q = np.zeros(self.num_kalman)
+        self.r = np.zeros(self.num_kalman)
+
+        for (name, params), (attr, group_slice, is_list) in zip(ema + kalman, self.groups):
+            _, _, low, high = SENSOR_GROUPS[name]
+            self.low[group_slice] = low
+            self.high[group_slice] = high
+            if params['method'] == 'ema':
+                self.alpha[group_slice] = params.get('alpha', 0.5)
+            else:
+                k = slice(group_slice.start - self.num_ema, group_slice.stop - self.num_ema)
+                q[k] = params.get('q', 1.0)
+                self.r[k] = params.get('r', 1.0)
+
+        # Kalman velocity, covariance [[p00, p01], [p01, p11]] and the
+        # discrete process noise for one tick
+        nk = self.num_kalman
+        self.v = np.zeros(nk)
+        self.p00 = np.zeros(nk)
+        self.p01 = np.zeros(nk)
+        self.p11 = np.zeros(nk)
+        self.q00 = q * dt ** 4 / 4
+        self.q01 = q * dt ** 3 / 2
+        self.q11 = q * dt ** 2
+
+        # Values whose filter restarts at their next valid reading; all of
+        # them before the first update
+        self._pending = np.ones(n, dtype=bool)
+
+        # Scratch buffers so update() allocates nothing
+        self._reset = np.zeros(n, dtype=bool)
+        self._reset_high = np.zeros(n, dtype=bool)
+        self._restart = np.zeros(n, dtype=bool)
+        self._tmp = np.zeros(n)
+        self._s = np.zeros(nk)
+        self._k0 = np.zeros(nk)
+        self._k1 = np.zeros(nk)
+
+        # True while x holds the filtered readings of the latest tick
+        self.current = False
+
+    def _layout(self, groups):
+        start = sum(s.stop - s.start for _, s, _ in self.groups)
+        offset = start
+        for name, _ in groups:
+            attr, size, _, _ = SENSOR_GROUPS[name]
+            self.groups.append((attr, slice(offset, offset + size), size > 1))
+            self._by_name[name] = self.groups[-1]
+            offset += size
+        return offset - start
+
+    def get(self, name):
+        '''Return a view of the filtered values for a group'''
+        return self.x[self._by_name[name][1]]
+
+    def filtered(self, name, raw):
+        '''Return the filtered value(s) of a group, or raw if it was not filtered this tick'''
+        group = self._by_name.get(name)
+        if group is None or not self.current:
+            return raw
+        _, group_slice, is_list = group
+        if is_list:
+            return self.x[group_slice]
+        return float(self.x[group_slice.start])
+
+    def update(self, z=None):
+        '''Filter the measurements in self.z (or copied from z) into self.x'''
+        if z is not None:
+            self.z[:] = z
+        z = self.z
+        x = self.x
+        self.current = True
+
+        ne = self.num_ema
+        tmp = self._tmp
+
+        # EMA: x += alpha * (z - x)
+        np.subtract(z[:ne], x[:ne], out=tmp[:ne])
+        tmp[:ne] *= self.alpha
+        x[:ne] += tmp[:ne]
+
+        # Kalman predict: x += v dt, P = F P F' + Q
+        dt = self.dt
+        xk = x[ne:]
+        zk = z[ne:]
+        v, p00, p01, p11 = self.v, self.p00, self.p01, self.p11
+        np.multiply(v, dt, out=self._s)
+        xk += self._s
+        np.multiply(p11, dt, out=self._k1)
+        np.multiply(p01, 2.0, out=self._k0)
+        self._k0 += self._k1
+        self._k0 *= dt
+        p00 += self._k0
+        p00 += self.q00
+        p01 += self._k1
+        p01 += self.q01
+        p11 += self.q11
+
+        # Kalman update: K = P H' / (H P H' + r)
+        np.add(p00, self.r, out=self._s)
+        np.divide(p00, self._s, out=self._k0)
+        np.divide(p01, self._s, out=self._k1)
+        np.subtract(zk, xk, out=self._s)
+        np.multiply(self._k1, self._s, out=tmp[ne:])
+        v += tmp[ne:]
+        self._s *= self._k0
+        xk += self._s
+        np.multiply(self._k1, p01, out=self._s)
+        p11 -= self._s
+        np.subtract(1.0, self._k0, out=self._k0)
+        p00 *= self._k0
+        p01 *= self._k0
+
+        # Sentinel readings bypass the filter
+        reset = self._reset
+        np.less(z, self.low, out=reset)
+        np.greater_equal(z, self.high, out=self._reset_high)
+        reset |= self._reset_high
+
+        # The first valid reading after a sentinel starts the filter afresh:
+        # x = z, no velocity and the covariance of a single measurement
+        restart = self._restart
+        np.logical_not(reset, out=restart)
+        restart &= self._pending
+        reset |= restart
+        np.copyto(x, z, where=reset)
+        kr = reset[ne:]
+        np.copyto(v, 0.0, where=kr)
+        np.copyto(p00, self.r, where=kr)
+        np.copyto(p01, 0.0, where=kr)
+        np.copyto(p11, 0.0, where=kr)
+
+        # Still pending: this tick's sentinels
+        reset ^= restart
+        self._pending[:] = reset
+
+    def apply(self, car_state):
+        '''Filter the sensors of car_state; the smoothed values are read with filtered()'''
+        z = self.z
+        for attr, group_slice, is_list in self.groups:
+            value = getattr(car_state, attr)
+            if value is None:
+                # Skip the tick; filtered() hands out raw values until the
+                # next complete one
+                self.current = False
+                return
+            if is_list:
+                z[group_slice] = value
+            else:
+                z[group_slice.start] = value
+
+        self.update()
+
+    def reset(self):
+        self.current = False
+        self._pending.fill(True)
+
+
+def benchmark(ticks=20000, budget_us=50.0, seed=0):
+    '''Time SensorFilterBank.update on noisy readings; return True if p99 is within budget'''
+    rng = np.random.default_rng(seed)
+    bank = SensorFilterBank()
+    n = len(bank.z)
+
+    truth = np.linspace(5.0, 150.0, n)
+    frames = list(truth + rng.normal(0.0, 0.5, size=(256, n)))
+
+    return run_benchmark(f'SensorFilterBank.update ({n} values)', bank.update, frames, ticks, budget_us)
+
+if __name__ == '__main__':
+    sys.exit(0 if benchmark() else 1)
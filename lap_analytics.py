@@ -0,0 +1,163 @@
+import json
+import os
+
+class LapAnalytics:
+    '''
+    Incremental lap and sector statistics, updated once per tick in O(1)
+
+    Lap boundaries are detected from curLapTime resetting and sectors from
+    distFromStart. When the track length is not known up front it is learned
+    from the furthest distFromStart seen during the first completed lap, so
+    sector splits start from the second lap onwards. A lap joined part way
+    through (e.g. a rolling start) is not recorded.
+    '''
+
+    def __init__(self, track_length=None, num_sectors=3):
+        self.num_sectors = num_sectors
+        self.track_length = track_length
+        self.sector_length = track_length / num_sectors if track_length else None
+
+        # Per-lap state
+        self.lap_start_damage = None
+        self.current_sector = 0
+        self.sector_start_time = 0.0
+        self.current_splits = [None] * num_sectors
+        self.max_dist_in_lap = 0.0
+        # False while the car is on a lap it joined part way through
+        self.lap_valid = None
+
+        # Previous tick values
+        self.prev_lap_time = None
+
+        # Session statistics
+        self.laps = []
+        self.best_lap = None
+        self.total_lap_time = 0.0
+        self.best_splits = [None] * num_sectors
+        self.max_speed = 0.0
+        self.off_track_time = 0.0
+        self.ticks = 0
+
+    def update(self, car_state):
+        '''Fold the current tick into the running statistics'''
+        cur_lap_time = car_state.getCurLapTime()
+        dist = car_state.getDistFromStart()
+        speed = car_state.getSpeedX()
+        damage = car_state.getDamage()
+        track_pos = car_state.getTrackPos()
+
+        if cur_lap_time is None or dist is None:
+            return
+
+        self.ticks += 1
+
+        if speed is not None and speed > self.max_speed:
+            self.max_speed = speed
+
+        if self.lap_start_damage is None:
+            self.lap_start_damage = damage
+
+        if self.lap_valid is None:
+            # A standing start begins at or before the line
+            self.lap_valid = cur_lap_time <= 0
+
+        prev = self.prev_lap_time
+        self.prev_lap_time = cur_lap_time
+
+        if prev is not None and cur_lap_time < prev:
+            # curLapTime went backwards: a lap has just been completed
+            last_lap = car_state.getLastLapTime()
+            if not last_lap or last_lap <= 0:
+                last_lap = prev
+            self._finish_lap(last_lap, damage)
+            return
+
+        if prev is not None and track_pos is not None and abs(track_pos) > 1:
+            self.off_track_time += cur_lap_time - prev
+
+        # Before the start line curLapTime is negative; nothing to split yet
+        if cur_lap_time < 0:
+            return
+
+        if dist > self.max_dist_in_lap:
+            self.max_dist_in_lap = dist
+
+        if self.sector_length:
+            sector = int(dist / self.sector_length)
+            if self.current_sector < sector < self.num_sectors:
+                self.current_splits[self.current_sector] = cur_lap_time - self.sector_start_time
+                self.current_sector = sector
+                self.sector_start_time = cur_lap_time
+
+    def _finish_lap(self, lap_time, damage):
+        if not self.lap_valid:
+            self.lap_valid = True
+            self._reset_lap(damage)
+            return
+
+        if self.sector_length:
+            self.current_splits[self.current_sector] = lap_time - self.sector_start_time
+            splits = list(self.current_splits)
+        else:
+            splits = None
+            # Learn the track length from the first full lap
+            if self.max_dist_in_lap > 0:
+                self.track_length = self.max_dist_in_lap
+                self.sector_length = self.track_length / self.num_sectors
+
+        lap_damage = None
+        if damage is not None and self.lap_start_damage is not None:
+            lap_damage = damage - self.lap_start_damage
+
+        self.laps.append({
+            'lap': len(self.laps) + 1,
+            'time': lap_time,
+            'splits': splits,
+            'damage': lap_damage,
+        })
+        self.total_lap_time += lap_time
+
+        if self.best_lap is None or lap_time < self.best_lap:
+            self.best_lap = lap_time
+
+        if splits:
+            for i, split in enumerate(splits):
+                if split is not None and (self.best_splits[i] is None or split < self.best_splits[i]):
+                    self.best_splits[i] = split
+
+        self._reset_lap(damage)
+
+    def _reset_lap(self, damage):
+        self.lap_start_damage = damage
+        self.current_sector = 0
+        self.sector_start_time = 0.0
+        self.current_splits = [None] * self.num_sectors
+        self.max_dist_in_lap = 0.0
+
+    def get_average_lap(self):
+        if not self.laps:
+            return None
+        return self.total_lap_time / len(self.laps)
+
+    def summary(self):
+        '''Return the session statistics as a plain dictionary'''
+        return {
+            'laps_completed': len(self.laps),
+            'best_lap': self.best_lap,
+            'average_lap': self.get_average_lap(),
+            'best_splits': self.best_splits,
+            'max_speed': self.max_speed,
+            'off_track_time': self.off_track_time,
+            'track_length': self.track_length,
+            'ticks': self.ticks,
+            'laps': self.laps,
+        }
+
+    def write_summary(self, filename):
+        '''Write the session statistics as JSON'''
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with open(filename, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
@@ -0,0 +1,249 @@
+import math
+import random
+import socket
+import threading
+import msgParser
+
+class LocalServer:
+    '''
+    Deterministic stand-in for the TORCS SCRC server
+
+    Simulates one car on a closed track of straights and constant-radius
+    bends with simple point-mass physics, in lock step with the client: a
+    sensor message is only sent once the previous control message has been
+    answered, and every tick advances exactly dt seconds of simulated time.
+    Given the same scenario and the same client decisions every run produces
+    the same lap times and damage, however fast the host machine is.
+
+    Rangefinders assume the track is locally straight, opponents drive along
+    the track axis at a constant speed and sensor noise comes from a seeded
+    random generator. It speaks the SCRC handshake, and sends ***shutdown***
+    after `laps` laps or `max_ticks` ticks.
+    '''
+
+    DT = 0.02
+    TRACK_WIDTH = 12.0
+    RANGE = 200.0
+    WHEELBASE = 3.0
+    STEER_LOCK = 0.785398
+    MAX_LATERAL_ACCEL = 15.0
+
+    # Oval: (length, curvature), positive curvature turns left
+    DEFAULT_TRACK = [
+        (400.0, 0.0),
+        (math.pi * 100.0, 0.01),
+        (400.0, 0.0),
+        (math.pi * 100.0, 0.01),
+    ]
+
+    def __init__(self, host='127.0.0.1', port=0, laps=2, max_ticks=20000, track=None,
+                 opponents=None, noise=0.0, seed=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(5.0)
+        self.port = self.sock.getsockname()[1]
+
+        self.parser = msgParser.MsgParser()
+        self.segments = track or self.DEFAULT_TRACK
+        self.track_length = sum(length for length, _ in self.segments)
+        self.laps = laps
+        self.max_ticks = max_ticks
+
+        # Opponents as [distance along the track, lateral offset, speed in m/s]
+        self.opponents = [list(o) for o in (opponents or [])]
+        self.noise = noise
+        self.random = random.Random(seed)
+
+        self.angles = [0.0] * 19
+
+        # Car state: distance along the track, lateral offset (positive to
+        # the left), heading relative to the track axis (positive to the left)
+        self.dist = 0.0
+        self.lateral = 0.0
+        self.heading = 0.0
+        self.speed = 0.0
+        self.gear = 1
+        self.rpm = 1000.0
+        self.damage = 0.0
+        self.dist_raced = 0.0
+        self.fuel = 94.0
+
+        self.ticks = 0
+        self.cur_lap_time = 0.0
+        self.last_lap_time = 0.0
+        self.lap_times = []
+
+        self.error = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+        self.sock.close()
+
+    def _serve(self):
+        try:
+            addr = self._handshake()
+            while True:
+                if len(self.lap_times) >= self.laps or self.ticks >= self.max_ticks:
+                    self.sock.sendto(b'***shutdown***', addr)
+                    return
+                self.sock.sendto(self._sensor_message().encode(), addr)
+
+                data, addr = self.sock.recvfrom(4096)
+                control = self.parser.parse(data.decode())
+                if control.get('meta', ['0'])[0] == '1':
+                    self.sock.sendto(b'***shutdown***', addr)
+                    return
+                self._step(control)
+        except Exception as e:
+            self.error = e
+
+    def _handshake(self):
+        while True:
+            data, addr = self.sock.recvfrom(4096)
+            msg = data.decode()
+            init = self.parser.parse(msg[msg.find('('):])
+            if init and 'init' in init:
+                self.angles = [float(a) for a in init['init']]
+                self.sock.sendto(b'***identified***', addr)
+                return addr
+
+    @staticmethod
+    def get_bends(segments):
+        '''Return (start, end) distances from the start line of every bend'''
+        bends = []
+        dist = 0.0
+        for length, curvature in segments:
+            if curvature:
+                bends.append((dist, dist + length))
+            dist += length
+        return bends
+
+    def _curvature(self, dist):
+        dist %= self.track_length
+        for length, curvature in self.segments:
+            if dist < length:
+                return curvature
+            dist -= length
+        return 0.0
+
+    def _step(self, control):
+        dt = self.DT
+        accel = float(control.get('accel', ['0'])[0])
+        brake = float(control.get('brake', ['0'])[0])
+        steer = max(-1.0, min(1.0, float(control.get('steer', ['0'])[0])))
+        self.gear = int(float(control.get('gear', ['1'])[0]))
+
+        # Longitudinal: throttle, brakes and aerodynamic drag
+        force = accel * 8.0 - brake * 15.0 - 0.002 * self.speed * self.speed
+        if self.gear < 0:
+            force = -force
+        self.speed = max(0.0, self.speed + force * dt)
+
+        # Lateral: bicycle model limited by grip
+        off_track = abs(self.lateral) > self.TRACK_WIDTH / 2
+        yaw_rate = self.speed * math.tan(steer * self.STEER_LOCK) / self.WHEELBASE
+        max_yaw_rate = self.MAX_LATERAL_ACCEL / max(self.speed, 1.0)
+        yaw_rate = max(-max_yaw_rate, min(max_yaw_rate, yaw_rate))
+        self.heading += (yaw_rate - self._curvature(self.dist) * self.speed) * dt
+        self.heading = math.atan2(math.sin(self.heading), math.cos(self.heading))
+
+        self.lateral += self.speed * math.sin(self.heading) * dt
+        ds = self.speed * math.cos(self.heading) * dt
+        self.dist += ds
+        self.dist_raced += ds
+        self.fuel -= abs(ds) * 0.0005
+
+        if off_track:
+            self.speed *= 0.98
+            self.damage += self.speed * 0.05
+            # Walls keep the car within a few metres of the track
+            limit = self.TRACK_WIDTH
+            self.lateral = max(-limit, min(limit, self.lateral))
+
+        for opponent in self.opponents:
+            opponent[0] += opponent[2] * dt
+            gap = (opponent[0] - self.dist) % self.track_length
+            if (gap < 4.0 or gap > self.track_length - 4.0) and abs(opponent[1] - self.lateral) < 2.0:
+                self.damage += 50.0
+                self.speed *= 0.5
+
+        self.rpm = min(9500.0, 1000.0 + self.speed * 3.6 * 180.0 / max(self.gear, 1))
+
+        self.ticks += 1
+        self.cur_lap_time += dt
+        if self.dist >= self.track_length:
+            self.dist -= self.track_length
+            for opponent in self.opponents:
+                opponent[0] -= self.track_length
+            self.last_lap_time = self.cur_lap_time
+            self.lap_times.append(self.cur_lap_time)
+            self.cur_lap_time = 0.0
+
+    def _noisy(self, value):
+        if self.noise:
+            return value + self.random.gauss(0.0, self.noise)
+        return value
+
+    def _rangefinders(self):
+        half = self.TRACK_WIDTH / 2
+        if abs(self.lateral) > half:
+            return [-1.0] * len(self.angles)
+
+        track = []
+        for angle in self.angles:
+            # Beam angles are clockwise (positive to the right)
+            direction = math.sin(self.heading - math.radians(angle))
+            if direction > 1e-6:
+                d = (half - self.lateral) / direction
+            elif direction < -1e-6:
+                d = (half + self.lateral) / -direction
+            else:
+                d = self.RANGE
+            track.append(self._noisy(min(d, self.RANGE)))
+        return track
+
+    def _opponent_sensors(self):
+        sensors = [self.RANGE] * 36
+        for s, lateral, _ in self.opponents:
+            ahead = (s - self.dist) % self.track_length
+            if ahead > self.track_length / 2:
+                ahead -= self.track_length
+            left = lateral - self.lateral
+            d = math.hypot(ahead, left)
+            if d >= self.RANGE:
+                continue
+            # Bearing clockwise from the car axis, in [-pi, pi)
+            bearing = -(math.atan2(left, ahead) - self.heading)
+            bearing = (bearing + math.pi) % (2 * math.pi)
+            sector = min(35, int(bearing / (math.pi / 18)))
+            sensors[sector] = min(sensors[sector], self._noisy(d))
+        return sensors
+
+    def _sensor_message(self):
+        sensors = {
+            'angle': [-self.heading],
+            'curLapTime': [self.cur_lap_time],
+            'damage': [self.damage],
+            'distFromStart': [self.dist],
+            'distRaced': [self.dist_raced],
+            'fuel': [self.fuel],
+            'gear': [self.gear],
+            'lastLapTime': [self.last_lap_time],
+            'opponents': self._opponent_sensors(),
+            'racePos': [1],
+            'rpm': [self.rpm],
+            'speedX': [self.speed * 3.6 * math.cos(self.heading)],
+            'speedY': [self.speed * 3.6 * math.sin(self.heading)],
+            'speedZ': [0.0],
+            'track': self._rangefinders(),
+            'trackPos': [self._noisy(self.lateral / (self.TRACK_WIDTH / 2))],
+            'wheelSpinVel': [self.speed / 0.3] * 4,
+            'z': [0.35],
+            'focus': [-1.0] * 5,
+        }
+        return self.parser.stringify(sensors)
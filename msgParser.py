@@ -1,31 +1,70 @@
+from event_log import get_logger
+
+logger = get_logger('msgParser')
+
+# Tags of the SCRC sensor and control messages. Keys of a bytes message are
+# looked up here instead of being decoded on every tick.
+KNOWN_TAGS = (
+    'angle', 'curLapTime', 'damage', 'distFromStart', 'distRaced', 'focus',
+    'fuel', 'gear', 'lastLapTime', 'opponents', 'racePos', 'rpm', 'speedX',
+    'speedY', 'speedZ', 'track', 'trackPos', 'trackEdgeDist', 'wheelSpinVel',
+    'z', 'accel', 'brake', 'clutch', 'steer', 'meta', 'init',
+)
+
 class MsgParser(object):
     '''
     A parser for received UDP messages and building UDP messages
     '''
     def __init__(self):
         '''Constructor'''
+        # bytes tag -> str key; tags that are not known yet are added the
+        # first time they are seen
+        self.tags = {tag.encode(): tag for tag in KNOWN_TAGS}
         
-    def parse(self, str_sensors):
-        '''Return a dictionary with tags and values from the UDP message'''
+    def parse(self, str_sensors, length=None):
+        '''Return a dictionary with tags and values from the UDP message
+        
+        str_sensors may also be a bytes-like buffer, in which case only its
+        first length bytes are parsed and values are left as bytes tokens,
+        which float() and int() accept directly.
+        '''
         sensors = {}
         
-        b_open = str_sensors.find('(')
+        if length is None:
+            length = len(str_sensors)
+        
+        is_text = isinstance(str_sensors, str)
+        if is_text:
+            open_char, close_char = '(', ')'
+        else:
+            open_char, close_char = b'(', b')'
+            # One copy into bytes makes every tag hashable, so it can be
+            # looked up in self.tags
+            if not isinstance(str_sensors, bytes):
+                str_sensors = bytes(memoryview(str_sensors)[:length])
+        
+        b_open = str_sensors.find(open_char, 0, length)
         
         while b_open >= 0:
-            b_close = str_sensors.find(')', b_open)
+            b_close = str_sensors.find(close_char, b_open, length)
             if b_close >= 0:
                 substr = str_sensors[b_open + 1: b_close]
                 items = substr.split()
                 if len(items) < 2:
-                    print("Problem parsing substring: ", substr)
+                    logger.warning('Problem parsing substring: %r', substr,
+                                   extra={'event': 'parse_substring'})
                 else:
-                    value = []
-                    for i in range(1,len(items)):
-                        value.append(items[i])
-                    sensors[items[0]] = value
-                b_open = str_sensors.find('(', b_close)
+                    key = items[0]
+                    if not is_text:
+                        tag = self.tags.get(key)
+                        if tag is None:
+                            tag = self.tags[key] = key.decode()
+                        key = tag
+                    sensors[key] = items[1:]
+                b_open = str_sensors.find(open_char, b_close, length)
             else:
-                print("Problem parsing sensor string: ", str_sensors)
+                logger.warning('Problem parsing sensor string: %r', str_sensors[:length],
+                               extra={'event': 'parse_sensors'})
                 return None
         
         return sensors
@@ -0,0 +1,215 @@
+import sys
+import argparse
+import selectors
+import socket
+import time
+import driver
+from transport import UdpReceiver
+from event_log import EventLog, get_logger
+from timing import get_stats
+
+logger = get_logger('multi_client')
+
+class CarSession:
+    '''
+    Handshake, driving and restart state machine for one car
+
+    Each car has its own non-blocking UDP socket and Driver. The session
+    only reacts to packets handed to it by the selector loop and to
+    check_timeout(), which resends the init string while the server has not
+    identified the car yet.
+    '''
+
+    IDENTIFYING = 0
+    RUNNING = 1
+    DONE = 2
+
+    # Resend the init string if the server has not answered within this time
+    INIT_TIMEOUT = 1.0
+
+    def __init__(self, name, host, port, bot_id, d, max_episodes=1, max_steps=0):
+        self.name = name
+        self.address = (host, port)
+        self.bot_id = bot_id
+        self.driver = d
+        self.max_episodes = max_episodes
+        self.max_steps = max_steps
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.receiver = UdpReceiver(self.sock)
+
+        self.state = self.IDENTIFYING
+        self.episode = 0
+        self.step = 0
+        self.last_init = None
+
+        # Seconds spent in Driver.drive for every tick
+        self.latencies = []
+
+    def send(self, msg):
+        try:
+            self.sock.sendto(msg.encode(), self.address)
+        except socket.error:
+            logger.error('Failed to send data', extra={'event': f'{self.name}.send_error'})
+            self.finish()
+
+    def send_init(self):
+        self.last_init = time.monotonic()
+        self.send(self.bot_id + self.driver.init())
+
+    def check_timeout(self, now):
+        if self.state == self.IDENTIFYING and now - self.last_init >= self.INIT_TIMEOUT:
+            logger.warning("Didn't get response from server...",
+                           extra={'event': f'{self.name}.recv_timeout'})
+            self.send_init()
+
+    def finish(self):
+        self.state = self.DONE
+
+    def on_readable(self):
+        '''Handle one datagram that the selector reported as ready'''
+        try:
+            length = self.receiver.receive()
+        except (BlockingIOError, InterruptedError):
+            return
+        except socket.error:
+            # e.g. ICMP port unreachable while the server is not up yet
+            return
+
+        if not length:
+            return
+
+        if self.state == self.IDENTIFYING:
+            if self.receiver.contains(b'***identified***'):
+                logger.info('Identified', extra={'event': f'{self.name}.identified'})
+                self.state = self.RUNNING
+                self.step = 0
+            return
+
+        if self.state != self.RUNNING:
+            return
+
+        if self.receiver.contains(b'***shutdown***'):
+            self.driver.onShutDown()
+            logger.info('Client Shutdown', extra={'event': f'{self.name}.shutdown'})
+            self.finish()
+            return
+
+        if self.receiver.contains(b'***restart***'):
+            self.driver.onRestart()
+            logger.info('Client Restart', extra={'event': f'{self.name}.restart'})
+            self.episode += 1
+            if self.episode == self.max_episodes:
+                self.finish()
+            else:
+                self.state = self.IDENTIFYING
+                self.send_init()
+            return
+
+        self.step += 1
+        if self.step != self.max_steps:
+            start = time.perf_counter()
+            msg = self.driver.drive(self.receiver.buffer, length)
+            self.latencies.append(time.perf_counter() - start)
+        else:
+            msg = '(meta 1)'
+
+        self.send(msg)
+
+    def get_latency_report(self):
+        '''Return (ticks, mean, p99, max) tick latency in microseconds'''
+        ticks = len(self.latencies)
+        if not ticks:
+            return 0, None, None, None
+        mean, p99, worst = get_stats(self.latencies)
+        return ticks, mean * 1e6, p99 * 1e6, worst * 1e6
+
+    def close(self):
+        self.sock.close()
+
+
+def run(sessions, poll_interval=0.1):
+    '''Drive all sessions from this thread until every one of them is done'''
+    selector = selectors.DefaultSelector()
+    for session in sessions:
+        selector.register(session.sock, selectors.EVENT_READ, session)
+        session.send_init()
+
+    open_sessions = list(sessions)
+    while open_sessions:
+        for key, _ in selector.select(poll_interval):
+            key.data.on_readable()
+
+        now = time.monotonic()
+        for session in open_sessions:
+            if session.state == CarSession.IDENTIFYING:
+                session.check_timeout(now)
+
+        for session in [s for s in open_sessions if s.state == CarSession.DONE]:
+            selector.unregister(session.sock)
+            session.close()
+            open_sessions.remove(session)
+
+    selector.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive several cars on a TORCS SCRC server from one process.')
+
+    parser.add_argument('--host', action='store', dest='host_ip', default='localhost',
+                        help='Host IP address (default: localhost)')
+    parser.add_argument('--port', action='store', type=int, dest='host_port', default=3001,
+                        help='Port of the first car; car i uses port + i (default: 3001)')
+    parser.add_argument('--cars', action='store', type=int, dest='cars', default=2,
+                        help='Number of cars to drive (default: 2)')
+    parser.add_argument('--id', action='store', dest='id', default='SCR',
+                        help='Bot ID (default: SCR)')
+    parser.add_argument('--maxEpisodes', action='store', dest='max_episodes', type=int, default=1,
+                        help='Maximum number of learning episodes (default: 1)')
+    parser.add_argument('--maxSteps', action='store', dest='max_steps', type=int, default=0,
+                        help='Maximum number of steps (default: 0)')
+    parser.add_argument('--stage', action='store', dest='stage', type=int, default=3,
+                        help='Stage (0 - Warm-Up, 1 - Qualifying, 2 - Race, 3 - Unknown)')
+    parser.add_argument('--accel', action='store', dest='accel', type=float, default=0.5,
+                        help='Constant throttle for every car, as there is no keyboard input (default: 0.5)')
+    parser.add_argument('--logLevel', action='store', dest='log_level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Event log level (default: INFO)')
+    parser.add_argument('--logFile', action='store', dest='log_file', default='logs/multi_client.log',
+                        help='Event log file (default: logs/multi_client.log)')
+
+    arguments = parser.parse_args(argv)
+
+    event_log = EventLog(arguments.log_level, arguments.log_file)
+
+    sessions = []
+    for i in range(arguments.cars):
+        d = driver.Driver(arguments.stage, keyboard_control=False)
+        d.setExternalAccel(arguments.accel)
+        sessions.append(CarSession(f'car{i}', arguments.host_ip, arguments.host_port + i,
+                                   arguments.id, d, arguments.max_episodes, arguments.max_steps))
+
+    print(f'Driving {arguments.cars} cars on {arguments.host_ip} ports '
+          f'{arguments.host_port}-{arguments.host_port + arguments.cars - 1}')
+
+    try:
+        run(sessions)
+    except KeyboardInterrupt:
+        pass
+
+    print('Tick latency per car (us):')
+    for session in sessions:
+        ticks, mean, p99, worst = session.get_latency_report()
+        if ticks:
+            print(f'  {session.name}: {ticks} ticks, mean {mean:.1f}, p99 {p99:.1f}, max {worst:.1f}')
+        else:
+            print(f'  {session.name}: no ticks')
+        session.close()
+
+    event_log.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import cProfile
+import gc
+import os
+import pstats
+import signal
+import time
+import tracemalloc
+from datetime import datetime
+from timing import get_stats
+
+# Source files whose functions are reported as one group each
+COMPONENTS = {
+    'driver.py': 'Driver',
+    'carState.py': 'CarState',
+    'msgParser.py': 'MsgParser',
+    'data_logger.py': 'DataLogger',
+}
+
+def get_component(filename):
+    return COMPONENTS.get(os.path.basename(filename), 'Other')
+
+
+class SessionProfiler:
+    '''
+    CPU and allocation profiler for a window of ticks in a live session
+
+    Two CPU modes are supported: 'cpu' runs cProfile (deterministic) and
+    'sample' interrupts the process with SIGPROF every sample_interval
+    seconds of CPU time and records the Python stack (Unix only). While the
+    window is open, tracemalloc tracks the bytes allocated during each tick
+    and gc.callbacks times every collection. write_report() groups the
+    results by Driver, CarState, MsgParser and DataLogger.
+    '''
+
+    def __init__(self, mode, start_step=0, num_steps=0, num_episodes=0,
+                 sample_interval=0.001, output_dir='logs'):
+        if mode not in ('cpu', 'sample'):
+            raise ValueError(f'Unknown profiling mode: {mode}')
+        if mode == 'sample' and not hasattr(signal, 'setitimer'):
+            raise ValueError('Sampling profiler needs signal.setitimer, which this platform lacks')
+
+        self.mode = mode
+        self.start_step = start_step
+        self.end_step = start_step + num_steps if num_steps > 0 else None
+        self.num_episodes = num_episodes
+        self.sample_interval = sample_interval
+        self.output_dir = output_dir
+
+        self.active = False
+        self.profile = cProfile.Profile() if mode == 'cpu' else None
+
+        # Sampling profiler counts, keyed by (filename, line, function)
+        self.self_samples = {}
+        self.total_samples = {}
+        self.num_samples = 0
+
+        # Per-tick measurements
+        self.tick_times = []
+        self.tick_allocs = []
+        self._tick_start = None
+        self._tick_memory = None
+
+        # Garbage collector pauses as (generation, seconds)
+        self.gc_pauses = []
+        self._gc_start = None
+
+        self.snapshot = None
+
+        # Only stop tracemalloc if this profiler started it, so an outer
+        # tracer (e.g. the regression gate's allocation run) keeps running
+        self._owns_tracing = False
+
+    def in_window(self, episode, step):
+        if self.num_episodes and episode >= self.num_episodes:
+            return False
+        if step < self.start_step:
+            return False
+        return self.end_step is None or step < self.end_step
+
+    def begin_tick(self, episode, step):
+        '''Call before the work of one tick; opens or closes the window as needed'''
+        if self.in_window(episode, step):
+            if not self.active:
+                self.start()
+        elif self.active:
+            self.stop()
+
+        if self.active:
+            tracemalloc.reset_peak()
+            self._tick_memory = tracemalloc.get_traced_memory()[0]
+            self._tick_start = time.perf_counter()
+
+    def end_tick(self):
+        if not self.active or self._tick_start is None:
+            return
+        self.tick_times.append(time.perf_counter() - self._tick_start)
+        # Peak above the starting point counts short-lived allocations too
+        self.tick_allocs.append(tracemalloc.get_traced_memory()[1] - self._tick_memory)
+        self._tick_start = None
+
+    def start(self):
+        self.active = True
+        gc.callbacks.append(self._on_gc)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+
+        if self.mode == 'cpu':
+            self.profile.enable()
+        else:
+            signal.signal(signal.SIGPROF, self._on_sample)
+            signal.setitimer(signal.ITIMER_PROF, self.sample_interval, self.sample_interval)
+
+    def stop(self):
+        if not self.active:
+            return
+        self.active = False
+
+        if self.mode == 'cpu':
+            self.profile.disable()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+        gc.callbacks.remove(self._on_gc)
+        self.snapshot = tracemalloc.take_snapshot()
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    def _on_gc(self, phase, info):
+        if phase == 'start':
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self.gc_pauses.append((info['generation'], time.perf_counter() - self._gc_start))
+            self._gc_start = None
+
+    def _on_sample(self, signum, frame):
+        self.num_samples += 1
+        if frame is None:
+            return
+
+        key = (frame.f_code.co_filename, frame.f_code.co_firstlineno, frame.f_code.co_name)
+        self.self_samples[key] = self.self_samples.get(key, 0) + 1
+
+        # Count each function once per sample even when it recurses
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            if key not in seen:
+                seen.add(key)
+                self.total_samples[key] = self.total_samples.get(key, 0) + 1
+            frame = frame.f_back
+
+    def close(self):
+        '''Stop profiling and write the report; return its filename'''
+        self.stop()
+        if not self.tick_times:
+            return None
+        return self.write_report()
+
+    def _function_rows(self):
+        '''Return {component: [(name, calls, self, total)]} sorted by total'''
+        groups = {}
+        if self.mode == 'cpu':
+            for (filename, line, name), (cc, nc, tt, ct, callers) in pstats.Stats(self.profile).stats.items():
+                groups.setdefault(get_component(filename), []).append((f'{name}:{line}', nc, tt, ct))
+        else:
+            for key, total in self.total_samples.items():
+                filename, line, name = key
+                groups.setdefault(get_component(filename), []).append(
+                    (f'{name}:{line}', None, self.self_samples.get(key, 0), total))
+
+        for rows in groups.values():
+            rows.sort(key=lambda row: row[3], reverse=True)
+        return groups
+
+    def _allocation_groups(self):
+        '''Return {component: (bytes, blocks)} still allocated when the window closed'''
+        groups = {}
+        if self.snapshot is None:
+            return groups
+        for stat in self.snapshot.statistics('filename'):
+            component = get_component(stat.traceback[0].filename)
+            size, count = groups.get(component, (0, 0))
+            groups[component] = (size + stat.size, count + stat.count)
+        return groups
+
+    def write_report(self, max_rows=15):
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = os.path.join(self.output_dir, f'profile_{stamp}.txt')
+
+        if self.mode == 'cpu':
+            self.profile.dump_stats(os.path.join(self.output_dir, f'profile_{stamp}.prof'))
+
+        ticks = len(self.tick_times)
+        time_mean, time_p99, time_max = get_stats(self.tick_times)
+        alloc_mean, alloc_p99, alloc_max = get_stats(self.tick_allocs)
+
+        lines = [
+            f'Profile mode: {self.mode}',
+            f'Ticks profiled: {ticks}',
+            f'Tick time (instrumented, with {"cProfile" if self.mode == "cpu" else "the sampler"} '
+            f'and tracemalloc running): mean {time_mean * 1e6:.1f} us, '
+            f'p99 {time_p99 * 1e6:.1f} us, max {time_max * 1e6:.1f} us',
+            f'Bytes allocated per tick: mean {alloc_mean:.0f}, '
+            f'p99 {alloc_p99}, max {alloc_max}',
+        ]
+
+        pauses = sorted(pause for _, pause in self.gc_pauses)
+        if pauses:
+            per_generation = {}
+            for generation, _ in self.gc_pauses:
+                per_generation[generation] = per_generation.get(generation, 0) + 1
+            lines.append(f'GC pauses: {len(pauses)} '
+                         f'({", ".join(f"gen{g}: {n}" for g, n in sorted(per_generation.items()))}), '
+                         f'total {sum(pauses) * 1e3:.2f} ms, max {pauses[-1] * 1e3:.2f} ms')
+        else:
+            lines.append('GC pauses: none')
+
+        if self.mode == 'sample':
+            lines.append(f'Samples: {self.num_samples} every {self.sample_interval * 1e3:.1f} ms of CPU time')
+
+        groups = self._function_rows()
+        allocations = self._allocation_groups()
+        for component in list(COMPONENTS.values()) + ['Other']:
+            lines.append('')
+            size, count = allocations.get(component, (0, 0))
+            lines.append(f'== {component} (live at window close: {size} bytes in {count} blocks) ==')
+
+            rows = groups.get(component)
+            if not rows:
+                lines.append('  no samples')
+                continue
+
+            if self.mode == 'cpu':
+                lines.append(f'  {"calls":>10} {"self s":>10} {"total s":>10}  function')
+                for name, calls, tottime, cumtime in rows[:max_rows]:
+                    lines.append(f'  {calls:>10} {tottime:>10.4f} {cumtime:>10.4f}  {name}')
+            else:
+                lines.append(f'  {"self":>10} {"total":>10}  function')
+                for name, _, own, total in rows[:max_rows]:
+                    lines.append(f'  {own:>10} {total:>10}  {name}')
+
+        with open(filename, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        print(f'Profile report written to {filename}')
+        return filename
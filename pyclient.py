@@ -2,129 +2,206 @@ import sys
 import argparse
 import socket
 import driver
-from data_logger import DataLogger
+from data_logger import DataLogger, COLUMNS, COLUMN_SETS
+from track_map import TrackMap
+from profiling import SessionProfiler
+from transport import UdpReceiver
+from event_log import EventLog, get_logger
+from filters import SensorFilterBank
 
-if __name__ == '__main__':
-    pass
-
-# Configure the argument parser
-parser = argparse.ArgumentParser(description='Python client to connect to the TORCS SCRC server.')
-
-parser.add_argument('--host', action='store', dest='host_ip', default='localhost',
-                    help='Host IP address (default: localhost)')
-parser.add_argument('--port', action='store', type=int, dest='host_port', default=3001,
-                    help='Host port number (default: 3001)')
-parser.add_argument('--id', action='store', dest='id', default='SCR',
-                    help='Bot ID (default: SCR)')
-parser.add_argument('--maxEpisodes', action='store', dest='max_episodes', type=int, default=1,
-                    help='Maximum number of learning episodes (default: 1)')
-parser.add_argument('--maxSteps', action='store', dest='max_steps', type=int, default=0,
-                    help='Maximum number of steps (default: 0)')
-parser.add_argument('--track', action='store', dest='track', default=None,
-                    help='Name of the track')
-parser.add_argument('--stage', action='store', dest='stage', type=int, default=3,
-                    help='Stage (0 - Warm-Up, 1 - Qualifying, 2 - Race, 3 - Unknown)')
-
-arguments = parser.parse_args()
-
-# Print summary
-print(f'Connecting to server host ip: {arguments.host_ip} @ port: {arguments.host_port}')
-print(f'Bot ID: {arguments.id}')
-print(f'Maximum episodes: {arguments.max_episodes}')
-print(f'Maximum steps: {arguments.max_steps}')
-print(f'Track: {arguments.track}')
-print(f'Stage: {arguments.stage}')
-print('*********************************************')
-
-try:
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-except socket.error as msg:
-    print('Could not make a socket.')
-    sys.exit(-1)
-
-# one second timeout
-sock.settimeout(1.0)
-
-shutdownClient = False
-curEpisode = 0
-
-verbose = False
-
-d = driver.Driver(arguments.stage)
-
-while not shutdownClient:
-    while True:
-        print(f'Sending id to server: {arguments.id}')
-        buf = arguments.id + d.init()
-        print(f'Sending init string to server: {buf}')
+def build_parser():
+    '''Configure the argument parser'''
+    parser = argparse.ArgumentParser(description='Python client to connect to the TORCS SCRC server.')
+
+    parser.add_argument('--host', action='store', dest='host_ip', default='localhost',
+                        help='Host IP address (default: localhost)')
+    parser.add_argument('--port', action='store', type=int, dest='host_port', default=3001,
+                        help='Host port number (default: 3001)')
+    parser.add_argument('--id', action='store', dest='id', default='SCR',
+                        help='Bot ID (default: SCR)')
+    parser.add_argument('--maxEpisodes', action='store', dest='max_episodes', type=int, default=1,
+                        help='Maximum number of learning episodes (default: 1)')
+    parser.add_argument('--maxSteps', action='store', dest='max_steps', type=int, default=0,
+                        help='Maximum number of steps (default: 0)')
+    parser.add_argument('--track', action='store', dest='track', default=None,
+                        help='Name of the track')
+    parser.add_argument('--stage', action='store', dest='stage', type=int, default=3,
+                        help='Stage (0 - Warm-Up, 1 - Qualifying, 2 - Race, 3 - Unknown)')
+    parser.add_argument('--logColumns', action='store', dest='log_columns', default='full',
+                        help=f'Telemetry columns: one of {", ".join(COLUMN_SETS)} or a comma-separated list (default: full)')
+    parser.add_argument('--logEvery', action='store', dest='log_every', type=int, default=1,
+                        help='Write telemetry every N ticks (default: 1)')
+    parser.add_argument('--filterSensors', action='store_true', dest='filter_sensors', default=False,
+                        help='Smooth noisy track, opponent, trackPos and angle sensors (default: off)')
+    parser.add_argument('--logLevel', action='store', dest='log_level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Event log level (default: INFO)')
+    parser.add_argument('--logFile', action='store', dest='log_file', default='logs/client.log',
+                        help='Event log file (default: logs/client.log)')
+    parser.add_argument('--profile', action='store', dest='profile', choices=['cpu', 'sample'], default=None,
+                        help='Profile the client: cpu (deterministic) or sample (statistical) (default: off)')
+    parser.add_argument('--profileStart', action='store', dest='profile_start', type=int, default=0,
+                        help='Step at which profiling starts in each episode (default: 0)')
+    parser.add_argument('--profileSteps', action='store', dest='profile_steps', type=int, default=0,
+                        help='Number of steps to profile, 0 for the rest of the episode (default: 0)')
+    parser.add_argument('--profileEpisodes', action='store', dest='profile_episodes', type=int, default=0,
+                        help='Number of episodes to profile, 0 for all (default: 0)')
+    
+    return parser
+
+
+def main(argv=None, d=None):
+    '''Run the client; d replaces the default keyboard-driven Driver'''
+    parser = build_parser()
+    arguments = parser.parse_args(argv)
+
+    # Print summary
+    print(f'Connecting to server host ip: {arguments.host_ip} @ port: {arguments.host_port}')
+    print(f'Bot ID: {arguments.id}')
+    print(f'Maximum episodes: {arguments.max_episodes}')
+    print(f'Maximum steps: {arguments.max_steps}')
+    print(f'Track: {arguments.track}')
+    print(f'Stage: {arguments.stage}')
+    if arguments.profile:
+        print(f'Profiling: {arguments.profile}')
+    print('*********************************************')
+
+    log_columns = arguments.log_columns
+    if log_columns not in COLUMN_SETS:
+        log_columns = [name.strip() for name in log_columns.split(',')]
+        unknown = [name for name in log_columns if name not in COLUMNS]
+        if unknown:
+            parser.error(f'unknown log columns: {", ".join(unknown)}')
+
+    # Events from the control loop go through a rate-limited background logger
+    event_log = EventLog(arguments.log_level, arguments.log_file)
+    logger = get_logger('pyclient')
+
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    except socket.error as msg:
+        logger.error('Could not make a socket.', extra={'event': 'socket_error'})
+        event_log.close()
+        sys.exit(-1)
+
+    # one second timeout
+    sock.settimeout(1.0)
+
+    # packets are received into one preallocated buffer and parsed without decoding
+    receiver = UdpReceiver(sock)
+
+    shutdownClient = False
+    curEpisode = 0
+
+    verbose = arguments.log_level == 'DEBUG'
+
+    if d is None:
+        d = driver.Driver(arguments.stage)
+    if arguments.filter_sensors:
+        d.filters = SensorFilterBank()
+
+    profiler = None
+    if arguments.profile:
+        profiler = SessionProfiler(arguments.profile, arguments.profile_start,
+                                   arguments.profile_steps, arguments.profile_episodes)
+
+    # Ctrl-C and the send-error exits still write the profile report, save
+    # the track map and flush the telemetry and event logs
+    try:
+        while not shutdownClient:
+            while True:
+                buf = arguments.id + d.init()
+                logger.info('Sending init string to server: %s', buf, extra={'event': 'send_init'})
         
-        try:
-            sock.sendto(buf.encode(), (arguments.host_ip, arguments.host_port))
-        except socket.error as msg:
-            print("Failed to send data...Exiting...")
-            sys.exit(-1)
+                try:
+                    sock.sendto(buf.encode(), (arguments.host_ip, arguments.host_port))
+                except socket.error as msg:
+                    logger.error('Failed to send data...Exiting...', extra={'event': 'send_error'})
+                    sys.exit(-1)
             
-        try:
-            buf, addr = sock.recvfrom(1000)
-            buf = buf.decode()
-        except socket.error as msg:
-            print("Didn't get response from server...")
+                try:
+                    receiver.receive()
+                except socket.error as msg:
+                    logger.warning("Didn't get response from server...", extra={'event': 'recv_timeout'})
     
-        if '***identified***' in buf:
-            print(f'Received: {buf}')
-            # Initialize logger when race starts
-            d.logger = DataLogger(arguments.track or 'unknown', 
-                                'warmup' if arguments.stage == 0 else 
-                                'qualifying' if arguments.stage == 1 else 
-                                'race' if arguments.stage == 2 else 'unknown')
-            break
-
-    currentStep = 0
+                if receiver.contains(b'***identified***'):
+                    logger.info('Received: %s', receiver.get_text(), extra={'event': 'identified'})
+                    # Initialize logger when race starts
+                    d.logger = DataLogger(arguments.track or 'unknown', 
+                                        'warmup' if arguments.stage == 0 else 
+                                        'qualifying' if arguments.stage == 1 else 
+                                        'race' if arguments.stage == 2 else 'unknown',
+                                        log_columns, arguments.log_every)
+                    # Maps are stored per track, so only keep one when the track is named
+                    if arguments.track and d.track_map is None:
+                        d.track_map = TrackMap.load(arguments.track, d.angles)
+                    break
+
+            currentStep = 0
     
-    while True:
-        # wait for an answer from server
-        buf = None
-        try:
-            buf, addr = sock.recvfrom(1000)
-            buf = buf.decode()
-        except socket.error as msg:
-            print("Didn't get response from server...")
+            while True:
+                # wait for an answer from server
+                length = None
+                try:
+                    length = receiver.receive()
+                except socket.error as msg:
+                    logger.warning("Didn't get response from server...", extra={'event': 'recv_timeout'})
         
-        if verbose:
-            print(f'Received: {buf}')
+                if verbose:
+                    logger.debug('Received: %s', receiver.get_text(), extra={'event': 'recv'})
         
-        if buf and '***shutdown***' in buf:
-            d.onShutDown()
-            shutdownClient = True
-            print('Client Shutdown')
-            break
+                buf = None
+                if length and receiver.contains(b'***shutdown***'):
+                    d.onShutDown()
+                    shutdownClient = True
+                    logger.info('Client Shutdown', extra={'event': 'shutdown'})
+                    break
         
-        if buf and '***restart***' in buf:
-            d.onRestart()
-            print('Client Restart')
-            break
+                if length and receiver.contains(b'***restart***'):
+                    d.onRestart()
+                    logger.info('Client Restart', extra={'event': 'restart'})
+                    break
         
-        currentStep += 1
-        if currentStep != arguments.max_steps:
-            if buf:
-                buf = d.drive(buf)
-        else:
-            buf = '(meta 1)'
+                currentStep += 1
+                if currentStep != arguments.max_steps:
+                    if length:
+                        if profiler:
+                            profiler.begin_tick(curEpisode, currentStep)
+                            buf = d.drive(receiver.buffer, length)
+                            profiler.end_tick()
+                        else:
+                            buf = d.drive(receiver.buffer, length)
+                else:
+                    buf = '(meta 1)'
         
-        if verbose:
-            print(f'Sending: {buf}')
+                if verbose:
+                    logger.debug('Sending: %s', buf, extra={'event': 'send'})
         
-        if buf:
-            try:
-                sock.sendto(buf.encode(), (arguments.host_ip, arguments.host_port))
-            except socket.error as msg:
-                print("Failed to send data...Exiting...")
-                sys.exit(-1)
+                if buf:
+                    try:
+                        sock.sendto(buf.encode(), (arguments.host_ip, arguments.host_port))
+                    except socket.error as msg:
+                        logger.error('Failed to send data...Exiting...', extra={'event': 'send_error'})
+                        sys.exit(-1)
     
-    curEpisode += 1
+            curEpisode += 1
     
-    if curEpisode == arguments.max_episodes:
-        shutdownClient = True
+            if curEpisode == arguments.max_episodes:
+                shutdownClient = True
         
+    finally:
+        if profiler:
+            profiler.close()
 
-sock.close()
+        if d.logger:
+            d.logger.close()
+
+        if d.track_map:
+            d.track_map.save()
+
+        sock.close()
+        event_log.close()
+
+
+if __name__ == '__main__':
+    main()
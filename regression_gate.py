@@ -0,0 +1,297 @@
+import sys
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+import driver
+import pyclient
+from local_server import LocalServer
+from timing import get_stats
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regression_baseline.json')
+
+# A metric regresses when it exceeds baseline * (1 + relative) + absolute.
+# Only these metrics are compared; p99_latency_us is reported for
+# information, as absolute times depend on the host.
+DEFAULT_TOLERANCES = {
+    'lap_time': {'relative': 0.005, 'absolute': 0.0},
+    'damage': {'relative': 0.05, 'absolute': 1.0},
+    'median_latency_ratio': {'relative': 0.25, 'absolute': 0.0},
+    'p99_latency_ratio': {'relative': 0.5, 'absolute': 0.0},
+    'allocs_per_tick': {'relative': 0.25, 'absolute': 256.0},
+}
+
+# Fewer timed runs than this make the latency check unreliable
+MIN_REPEAT = 3
+
+# A fixed SCRC-sized message for the reference workload
+REFERENCE_MESSAGE = ''.join(
+    f'(s{i} ' + ' '.join(f'{i * 1.5 + j:.4f}' for j in range(4)) + ')' for i in range(25))
+
+
+def reference_workload():
+    '''
+    Fixed pure-Python work, independent of the client code, that is timed
+    next to every drive() call
+
+    It parses a message about the size of an SCRC sensor message, so it
+    slows down with the host (CPU speed, load, interpreter version) the same
+    way drive() does but never with a change to the client.
+    '''
+    values = {}
+    for group in REFERENCE_MESSAGE[1:-1].split(')('):
+        items = group.split()
+        values[items[0]] = [float(v) for v in items[1:]]
+    return values
+
+
+class ScriptedDriver(driver.Driver):
+    '''
+    Driver whose throttle and brake come from a scenario policy instead of
+    the keyboard, and which times every call to drive()
+
+    The policy sees the state of the previous tick, as the real keyboard
+    inputs would, and returns (accel, brake). Every tick also times
+    reference_workload(), so both see the same host and the same noise.
+    '''
+
+    def __init__(self, policy, measure_allocations=False):
+        # Stage 3 is 'unknown', as pyclient uses by default
+        super().__init__(3, keyboard_control=False)
+        self.policy = policy
+        self.measure_allocations = measure_allocations
+        self.latencies = []
+        self.reference_latencies = []
+        self.allocations = []
+
+    def drive(self, msg, length=None):
+        accel, brake = self.policy(self)
+        self.setExternalAccel(accel)
+        self.setExternalBrake(brake)
+
+        if self.measure_allocations:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+            result = super().drive(msg, length)
+            self.allocations.append(tracemalloc.get_traced_memory()[1] - start_memory)
+            return result
+
+        start = time.perf_counter()
+        reference_workload()
+        self.reference_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = super().drive(msg, length)
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+
+def get_speed(d):
+    return d.state.getSpeedX() or 0.0
+
+def constant_throttle(accel):
+    return lambda d: (accel, 0.0)
+
+def brake_for_bends(d):
+    '''Full throttle on the straights, held to 120 km/h from 100 m before each bend to its exit'''
+    dist = d.state.getDistFromStart() or 0.0
+    for start, end in LocalServer.get_bends(LocalServer.DEFAULT_TRACK):
+        if start - 100.0 <= dist < end:
+            if get_speed(d) > 120.0:
+                return 0.0, 1.0
+            return 0.3, 0.0
+    return 1.0, 0.0
+
+def follow_traffic(d):
+    '''Lift and brake while a car is close ahead and getting closer'''
+    closing = d.opponents.nearest_closing_speed
+    if not d.opponents.front_free and closing is not None and closing > 0.0:
+        return 0.0, 0.5
+    return 0.8, 0.0
+
+
+# Every scenario: policy, LocalServer keyword arguments, extra pyclient arguments
+SCENARIOS = {
+    'cruise': (constant_throttle(0.25), {}, []),
+    'full_throttle': (constant_throttle(1.0), {}, []),
+    'brake_for_bends': (brake_for_bends, {}, []),
+    'traffic': (follow_traffic, {'opponents': [(150.0, 0.0, 20.0), (700.0, -3.0, 25.0)]}, []),
+    'noisy_filtered': (constant_throttle(0.25), {'noise': 0.05, 'seed': 1}, ['--filterSensors']),
+}
+
+
+def run_once(name, measure_allocations):
+    '''Run one scenario through pyclient.main against a fresh LocalServer'''
+    policy, server_args, client_args = SCENARIOS[name]
+    server = LocalServer(**server_args)
+    d = ScriptedDriver(policy, measure_allocations)
+
+    argv = ['--host', '127.0.0.1', '--port', str(server.port), '--track', 'local_oval',
+            '--logLevel', 'ERROR', '--logFile', ''] + client_args
+
+    # DataLogger and TrackMap write relative to the working directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            server.start()
+            if measure_allocations:
+                tracemalloc.start()
+            with contextlib.redirect_stdout(io.StringIO()):
+                pyclient.main(argv, d)
+        finally:
+            if measure_allocations:
+                tracemalloc.stop()
+            os.chdir(cwd)
+            server.join(5.0)
+
+    if server.error:
+        raise RuntimeError(f'{name}: local server failed: {server.error!r}')
+    return server, d
+
+
+def get_latency_ratios(d):
+    '''Return the (median, p99) drive() latency of one run over that of reference_workload()'''
+    median = statistics.median(d.latencies) / statistics.median(d.reference_latencies)
+    p99 = get_stats(d.latencies)[1] / get_stats(d.reference_latencies)[1]
+    return median, p99
+
+
+def run_scenario(name, repeat=MIN_REPEAT):
+    '''Return the metrics of one scenario
+
+    Tick latency is compared as the median and p99 of drive() over those of
+    the reference workload timed in the same ticks, so a baseline from one
+    host holds on another. The median ratio is steady enough for a tight
+    tolerance, the p99 ratio guards the tail. Both are the median over
+    `repeat` timed runs, so neither one noisy run nor the number of runs
+    shifts them; the informational p99_latency_us is the best run.
+    Allocations come from one extra run under tracemalloc, which is too slow
+    to time.
+    '''
+    runs = [run_once(name, False) for _ in range(repeat)]
+    traced_server, traced = run_once(name, True)
+
+    for server, _ in runs:
+        if server.lap_times != traced_server.lap_times or server.damage != traced_server.damage:
+            raise RuntimeError(f'{name}: results differ between runs, the scenario is not deterministic')
+
+    server, d = runs[0]
+    ratios = [get_latency_ratios(d) for _, d in runs if d.latencies]
+    return {
+        'ticks': len(d.latencies),
+        'laps': len(server.lap_times),
+        'lap_time': sum(server.lap_times) / len(server.lap_times) if server.lap_times else None,
+        'damage': server.damage,
+        'p99_latency_us': min(get_stats(d.latencies)[1] for _, d in runs) * 1e6 if d.latencies else None,
+        'median_latency_ratio': statistics.median(r[0] for r in ratios) if ratios else None,
+        'p99_latency_ratio': statistics.median(r[1] for r in ratios) if ratios else None,
+        'allocs_per_tick': sum(traced.allocations) / len(traced.allocations) if traced.allocations else None,
+    }
+
+
+def compare(name, result, baseline, tolerances):
+    '''Return a list of regression messages for one scenario'''
+    failures = []
+    for metric, tolerance in tolerances.items():
+        base = baseline.get(metric)
+        value = result.get(metric)
+        if base is None:
+            continue
+        if value is None:
+            failures.append(f'{name}.{metric}: no value (baseline {base:.3f})')
+            continue
+        limit = base * (1.0 + tolerance['relative']) + tolerance['absolute']
+        if value > limit:
+            failures.append(f'{name}.{metric}: {value:.3f} > {limit:.3f} (baseline {base:.3f})')
+
+    if result['laps'] < baseline.get('laps', 0):
+        failures.append(f'{name}.laps: {result["laps"]} < {baseline["laps"]}')
+    return failures
+
+
+def get_tolerances(baseline):
+    '''Return the tolerance of every compared metric, as tuned in the baseline file or by default'''
+    tuned = baseline.get('tolerances', {})
+    return {metric: tuned.get(metric, default) for metric, default in DEFAULT_TOLERANCES.items()}
+
+
+def format_value(value):
+    return '-' if value is None else f'{value:.3f}'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Lap-time and tick-latency regression gate against a local SCRC stand-in.')
+    parser.add_argument('--baseline', action='store', dest='baseline', default=BASELINE_FILE,
+                        help=f'Baseline file (default: {os.path.basename(BASELINE_FILE)})')
+    parser.add_argument('--update', action='store_true', dest='update', default=False,
+                        help='Write the current results as the new baseline instead of comparing')
+    parser.add_argument('--repeat', action='store', dest='repeat', type=int, default=MIN_REPEAT,
+                        help=f'Timed runs per scenario; the best p99 latency is kept (default: {MIN_REPEAT})')
+    parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(SCENARIOS),
+                        help='Scenario to run, may be repeated (default: all)')
+    arguments = parser.parse_args(argv)
+
+    names = arguments.scenarios or list(SCENARIOS)
+
+    if arguments.repeat < MIN_REPEAT:
+        print(f'Warning: with --repeat {arguments.repeat} (< {MIN_REPEAT}) one noisy run decides '
+              f'the latency check, which is unreliable', file=sys.stderr)
+
+    baseline = None
+    if not arguments.update:
+        if not os.path.exists(arguments.baseline):
+            print(f'No baseline at {arguments.baseline}; run with --update to create one')
+            return 2
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    for name in names:
+        results[name] = run_scenario(name, arguments.repeat)
+        r = results[name]
+        print(f'{name:16} laps {r["laps"]} lap_time {format_value(r["lap_time"])} s '
+              f'damage {format_value(r["damage"])} p99 {format_value(r["p99_latency_us"])} us '
+              f'(x{format_value(r["median_latency_ratio"])} median, x{format_value(r["p99_latency_ratio"])} p99 '
+              f'of reference) '
+              f'allocs {format_value(r["allocs_per_tick"])} B/tick')
+
+    if arguments.update:
+        data = {'tolerances': DEFAULT_TOLERANCES, 'scenarios': results}
+        if os.path.exists(arguments.baseline):
+            with open(arguments.baseline) as f:
+                old = json.load(f)
+            data['tolerances'] = get_tolerances(old)
+            old['scenarios'].update(results)
+            data['scenarios'] = old['scenarios']
+        with open(arguments.baseline, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {arguments.baseline}')
+        return 0
+
+    tolerances = get_tolerances(baseline)
+    failures = []
+    for name, result in results.items():
+        if name not in baseline['scenarios']:
+            print(f'{name}: not in baseline, skipped')
+            continue
+        failures += compare(name, result, baseline['scenarios'][name], tolerances)
+
+    if failures:
+        print('REGRESSION:')
+        for failure in failures:
+            print(f'  {failure}')
+        return 1
+
+    print('OK: no regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
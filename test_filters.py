@@ -0,0 +1,83 @@
+import numpy as np
+from filters import SensorFilterBank
+
+
+def settle(bank, group, value, ticks=50):
+    '''Feed a constant reading to one group until its filter has converged'''
+    z = bank.z.copy()
+    z[bank._by_name[group][1]] = value
+    for _ in range(ticks):
+        bank.update(z)
+    return z
+
+
+def test_ema_restarts_after_sentinel():
+    bank = SensorFilterBank({'opponents': {'method': 'ema', 'alpha': 0.5}})
+    z = settle(bank, 'opponents', 200.0)
+    assert np.all(bank.get('opponents') == 200.0)
+
+    # A car appears after the sector read "empty"
+    z[0] = 10.0
+    bank.update(z)
+    assert bank.get('opponents')[0] == 10.0
+
+    # From then on the value is smoothed again
+    z[0] = 12.0
+    bank.update(z)
+    assert bank.get('opponents')[0] == 11.0
+
+
+def test_kalman_restarts_after_sentinel():
+    bank = SensorFilterBank({'track': {'method': 'kalman', 'q': 100.0, 'r': 1.0}})
+    z = settle(bank, 'track', 50.0)
+
+    # Off track: the rangefinders read -1, passed through unfiltered
+    z[:] = -1.0
+    bank.update(z)
+    assert np.all(bank.get('track') == -1.0)
+    bank.update(z)
+
+    # Back on track: no blending with -1 and no velocity from the jump
+    z[:] = 50.0
+    bank.update(z)
+    assert np.all(bank.get('track') == 50.0)
+    for _ in range(5):
+        bank.update(z)
+        assert np.allclose(bank.get('track'), 50.0)
+    assert np.allclose(bank.v, 0.0)
+
+
+def test_state_is_not_modified():
+    class State:
+        track = [50.0] * 19
+        opponents = [200.0] * 36
+        trackPos = 0.1
+        angle = 0.0
+
+    state = State()
+    bank = SensorFilterBank()
+    bank.apply(state)
+    state.trackPos = 0.3
+    bank.apply(state)
+
+    assert state.trackPos == 0.3
+    assert 0.1 < bank.filtered('trackPos', state.trackPos) < 0.3
+    assert bank.filtered('speedX', 5.0) == 5.0
+
+
+def test_incomplete_tick_returns_raw():
+    class State:
+        track = [50.0] * 19
+        opponents = [200.0] * 36
+        trackPos = 0.1
+        angle = 0.0
+
+    state = State()
+    bank = SensorFilterBank()
+    bank.apply(state)
+    bank.apply(state)
+
+    state.track = None
+    state.trackPos = 0.5
+    bank.apply(state)
+    assert bank.filtered('trackPos', state.trackPos) == 0.5
@@ -0,0 +1,35 @@
+import time
+
+def get_stats(values):
+    '''Return (mean, p99, max) of a list of samples, or (None, None, None) if it is empty
+
+    p99 is the nearest-rank percentile: the sample below which 99% of the
+    samples fall.
+    '''
+    n = len(values)
+    if not n:
+        return None, None, None
+    values = sorted(values)
+    return sum(values) / n, values[min(n - 1, int(n * 0.99))], values[-1]
+
+
+def run_benchmark(label, update, frames, ticks=20000, budget_us=50.0):
+    '''
+    Time update(frame) over frames in turn and print the tick latency
+
+    Returns True if the p99 latency is within budget_us, so a module can end
+    its benchmark with sys.exit(0 if ... else 1).
+    '''
+    timings = [0.0] * ticks
+    num_frames = len(frames)
+    clock = time.perf_counter
+    for t in range(ticks):
+        frame = frames[t % num_frames]
+        start = clock()
+        update(frame)
+        timings[t] = clock() - start
+
+    mean, p99, _ = get_stats(timings)
+    print(f'{label}: mean {mean * 1e6:.2f} us, p99 {p99 * 1e6:.2f} us '
+          f'over {ticks} ticks (budget {budget_us:.0f} us)')
+    return p99 * 1e6 <= budget_us
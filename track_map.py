@@ -0,0 +1,215 @@
+import json
+import math
+import os
+from array import array
+
+class TrackMap:
+    '''
+    Distance-indexed map of the track built from rangefinder telemetry
+
+    distFromStart is split into fixed-size bins. Every tick the bin under the
+    car accumulates a track width and curvature estimate and the observed
+    speed. finalize() precomputes the distance to the next corner for every
+    bin so that lookups while driving are O(1); update() calls it whenever
+    distFromStart wraps at the start line, so a lap learned in this session
+    is used from the next lap on. max_length is only the initial capacity,
+    the bins grow to fit longer tracks.
+
+    Curvature is signed, positive for right-hand bends, and is estimated from
+    the longest rangefinder beam: a chord of length d leaving the track axis
+    at angle phi lies on a circle of curvature 2 * sin(phi) / d.
+    '''
+
+    def __init__(self, track_name, angles, bin_size=10.0, max_length=10000.0,
+                 corner_curvature=0.005):
+        self.track_name = track_name
+        self.bin_size = bin_size
+        self.num_bins = int(math.ceil(max_length / bin_size))
+        self.corner_curvature = corner_curvature
+
+        # Rangefinder beam directions in radians, as sent in the init string
+        self.beam_angles = [math.radians(a) for a in angles]
+        self.left_beam = self.beam_angles.index(min(self.beam_angles))
+        self.right_beam = self.beam_angles.index(max(self.beam_angles))
+
+        n = self.num_bins
+        self.width_sum = array('d', [0.0]) * n
+        self.width_count = array('l', [0]) * n
+        self.curvature_sum = array('d', [0.0]) * n
+        self.curvature_count = array('l', [0]) * n
+        self.speed_sum = array('d', [0.0]) * n
+        self.speed_max = array('d', [0.0]) * n
+        self.speed_count = array('l', [0]) * n
+
+        # Filled in by finalize()
+        self.used_bins = 0
+        self.next_corner = array('l', [-1]) * n
+
+        # Last distFromStart seen, to notice the car crossing the start line
+        self.last_dist = None
+
+    def get_bin(self, dist):
+        return max(0, int(dist / self.bin_size))
+
+    def _grow(self, num_bins):
+        '''Extend every bin array to at least num_bins, doubling the capacity'''
+        extra = max(num_bins, 2 * self.num_bins) - self.num_bins
+        for name in ('width_sum', 'curvature_sum', 'speed_sum', 'speed_max'):
+            getattr(self, name).extend(array('d', [0.0]) * extra)
+        for name in ('width_count', 'curvature_count', 'speed_count'):
+            getattr(self, name).extend(array('l', [0]) * extra)
+        self.next_corner.extend(array('l', [-1]) * extra)
+        self.num_bins += extra
+
+    def update(self, car_state):
+        '''Accumulate the current tick into the bin under the car'''
+        dist = car_state.getDistFromStart()
+        track = car_state.getTrack()
+        angle = car_state.getAngle()
+        track_pos = car_state.getTrackPos()
+
+        if dist is None or track is None or angle is None:
+            return
+
+        # A large drop in distFromStart means a lap has been completed
+        if self.last_dist is not None and self.last_dist - dist > self.used_bins * self.bin_size / 2:
+            self.finalize()
+        self.last_dist = dist
+
+        i = self.get_bin(dist)
+        if i >= self.num_bins:
+            self._grow(i + 1)
+        if i + 1 > self.used_bins:
+            self.used_bins = i + 1
+
+        speed = car_state.getSpeedX()
+        if speed is not None:
+            self.speed_sum[i] += speed
+            self.speed_count[i] += 1
+            if speed > self.speed_max[i]:
+                self.speed_max[i] = speed
+
+        # Rangefinders read -1 when the car is off the track
+        if track_pos is None or abs(track_pos) > 1 or track[0] < 0:
+            return
+
+        left = track[self.left_beam]
+        right = track[self.right_beam]
+        self.width_sum[i] += (left + right) * math.cos(angle)
+        self.width_count[i] += 1
+
+        d = max(track)
+        beam = track.index(d)
+        if d > 0:
+            # angle is positive when the track axis is to the left of the car
+            phi = self.beam_angles[beam] + angle
+            self.curvature_sum[i] += 2.0 * math.sin(phi) / d
+            self.curvature_count[i] += 1
+
+    def get_width(self, dist):
+        i = self.get_bin(dist)
+        if i >= self.used_bins or not self.width_count[i]:
+            return None
+        return self.width_sum[i] / self.width_count[i]
+
+    def get_curvature(self, dist):
+        i = self.get_bin(dist)
+        if i >= self.used_bins or not self.curvature_count[i]:
+            return None
+        return self.curvature_sum[i] / self.curvature_count[i]
+
+    def get_speed(self, dist):
+        '''Return the (average, maximum) speed observed at dist'''
+        i = self.get_bin(dist)
+        if i >= self.used_bins or not self.speed_count[i]:
+            return None, None
+        return self.speed_sum[i] / self.speed_count[i], self.speed_max[i]
+
+    def finalize(self):
+        '''Precompute the next corner for every bin (O(n), run once per lap and on load)'''
+        n = self.used_bins
+        if n == 0:
+            return
+
+        is_corner = [False] * n
+        for i in range(n):
+            count = self.curvature_count[i]
+            if count and abs(self.curvature_sum[i] / count) >= self.corner_curvature:
+                is_corner[i] = True
+
+        # Walk backwards twice so the lookahead wraps past the start line
+        nxt = -1
+        for k in range(2 * n - 1, -1, -1):
+            i = k % n
+            if is_corner[i]:
+                nxt = i
+            if k < n:
+                self.next_corner[i] = nxt
+
+    def get_next_corner(self, dist):
+        '''Return (distance ahead, curvature) of the next corner, or (None, None)'''
+        i = self.get_bin(dist)
+        if i >= self.used_bins or self.next_corner[i] < 0:
+            return None, None
+
+        j = self.next_corner[i]
+        ahead = (j - i) * self.bin_size
+        if ahead < 0:
+            ahead += self.used_bins * self.bin_size
+        return ahead, self.curvature_sum[j] / self.curvature_count[j]
+
+    def to_dict(self):
+        n = self.used_bins
+        return {
+            'track_name': self.track_name,
+            'bin_size': self.bin_size,
+            'used_bins': n,
+            'width_sum': self.width_sum[:n].tolist(),
+            'width_count': self.width_count[:n].tolist(),
+            'curvature_sum': self.curvature_sum[:n].tolist(),
+            'curvature_count': self.curvature_count[:n].tolist(),
+            'speed_sum': self.speed_sum[:n].tolist(),
+            'speed_max': self.speed_max[:n].tolist(),
+            'speed_count': self.speed_count[:n].tolist(),
+        }
+
+    def save(self, filename=None):
+        '''Persist the accumulated map, by default to maps/<track_name>.json'''
+        if filename is None:
+            filename = self.get_filename(self.track_name)
+
+        directory = os.path.dirname(filename)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.finalize()
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @staticmethod
+    def get_filename(track_name):
+        return os.path.join('maps', f'{track_name}.json')
+
+    @classmethod
+    def load(cls, track_name, angles, filename=None, **kwargs):
+        '''Load the stored map for track_name, or start an empty one'''
+        if filename is None:
+            filename = cls.get_filename(track_name)
+
+        if not os.path.exists(filename):
+            return cls(track_name, angles, **kwargs)
+
+        with open(filename) as f:
+            data = json.load(f)
+
+        kwargs['bin_size'] = data['bin_size']
+        track_map = cls(track_name, angles, **kwargs)
+        n = data['used_bins']
+        if n > track_map.num_bins:
+            track_map._grow(n)
+        for name in ('width_sum', 'width_count', 'curvature_sum', 'curvature_count',
+                     'speed_sum', 'speed_max', 'speed_count'):
+            getattr(track_map, name)[:n] = array(getattr(track_map, name).typecode, data[name][:n])
+        track_map.used_bins = n
+        track_map.finalize()
+        return track_map
@@ -0,0 +1,67 @@
+import errno
+import socket
+import sys
+from event_log import get_logger
+
+logger = get_logger('transport')
+
+class UdpReceiver:
+    '''
+    Receives UDP datagrams into one preallocated buffer
+
+    recv_into() writes each packet straight into a bytearray that lives for
+    the whole session, so receiving creates no bytes or str object per
+    tick. The buffer is handed as-is, together with the packet length, to
+    MsgParser.parse. A packet larger than the buffer is dropped and counted
+    instead of being parsed; on Linux MSG_TRUNC makes recv_into report the
+    real datagram size, on Windows recv_into fails with WSAEMSGSIZE, and
+    elsewhere a completely filled buffer is treated as truncated.
+    '''
+
+    # errno of an oversized datagram: EMSGSIZE, or WSAEMSGSIZE on Windows
+    MSG_SIZE_ERRORS = (errno.EMSGSIZE, 10040)
+
+    # SCRC sensor messages are ~1.5 KB even with all 36 opponent sensors
+    DEFAULT_SIZE = 8192
+
+    def __init__(self, sock, size=DEFAULT_SIZE):
+        self.sock = sock
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.truncated = 0
+
+        if sys.platform.startswith('linux'):
+            self.flags = socket.MSG_TRUNC
+        else:
+            self.flags = 0
+
+    def receive(self):
+        '''Receive one datagram; return its length, or None if it was truncated'''
+        self.length = 0
+        try:
+            n = self.sock.recv_into(self.buffer, 0, self.flags)
+        except OSError as e:
+            if e.errno not in self.MSG_SIZE_ERRORS:
+                raise
+            return self._drop(None)
+
+        if n > len(self.buffer) or (not self.flags and n == len(self.buffer)):
+            return self._drop(n)
+
+        self.length = n
+        return n
+
+    def _drop(self, size):
+        '''Count and log a truncated datagram of size bytes (None if unknown)'''
+        self.truncated += 1
+        logger.warning('Dropped truncated packet', extra={'event': 'packet_truncated',
+                       'size': size, 'buffer_size': len(self.buffer)})
+        return None
+
+    def contains(self, marker):
+        '''Return True if the last datagram contains the bytes marker'''
+        return self.buffer.find(marker, 0, self.length) >= 0
+
+    def get_text(self):
+        '''Decode the last datagram, for printing only'''
+        return self.buffer[:self.length].decode(errors='replace')